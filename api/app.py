@@ -57,6 +57,19 @@ current_total_power = 0
 stable_ml_accuracy = None
 stable_anomaly_data = []
 last_anomaly_update = 0
+attribution_lock = threading.Lock()
+attribution_watermark = None
+last_attributed_power = None
+last_eviction_hour = None
+zone_presence_intervals = {}
+zone_hourly_power = {}
+zone_hourly_aggregates = {}
+geofence_hourly_totals = {}
+geofence_aggregates_version = 0
+cached_geofence_analytics = None
+MAX_ATTRIBUTION_GAP_HOURS = 2
+GEOFENCE_WINDOW_HOURS = 24
+BASELINE_DAYS = 7
 
 DEVICE_POWER_MAP = {
     'Main Light': {'base': 15, 'max': 60},
@@ -70,6 +83,15 @@ DEVICE_POWER_MAP = {
     'Dryer': {'base': 2000, 'max': 3000}
 }
 
+SEED_DEVICE_SCHEDULE = [
+    {'room': 'Kitchen', 'name': 'Refrigerator', 'property': 'power', 'value': 80, 'hours': range(0, 24)},
+    {'room': 'Bathroom', 'name': 'Water Heater', 'property': 'temperature', 'value': 60, 'hours': range(6, 8)},
+    {'room': 'Living Room', 'name': 'AC', 'property': 'temp', 'value': 72, 'hours': range(13, 17)},
+    {'room': 'Living Room', 'name': 'Main Light', 'property': 'brightness', 'value': 70, 'hours': range(18, 24)},
+    {'room': 'Living Room', 'name': 'TV', 'property': 'volume', 'value': 30, 'hours': range(19, 23)},
+    {'room': 'Bedroom', 'name': 'Fan', 'property': 'speed', 'value': 50, 'hours': [22, 23, 0, 1, 2, 3, 4, 5]}
+]
+
 def get_device_state_hash(device_states):
     if not device_states:
         return hash("")
@@ -149,8 +171,19 @@ def track_device_activity(device_states_data):
     if len(device_activity_history) > 100:
         device_activity_history.pop(0)
 
-def generate_realistic_energy_data(device_states_data=None):
-    current_time = datetime.now()
+def build_seed_device_states(timestamp):
+    seed_device_states = {}
+    for device in SEED_DEVICE_SCHEDULE:
+        seed_device_states.setdefault(device['room'], []).append({
+            'name': device['name'],
+            'isOn': timestamp.hour in device['hours'] and random.random() < 0.85,
+            'value': max(0, min(100, device['value'] + random.randint(-15, 15))),
+            'property': device['property']
+        })
+    return seed_device_states
+
+def generate_realistic_energy_data(device_states_data=None, current_time=None):
+    current_time = current_time or datetime.now()
     hour = current_time.hour
     day_of_week = current_time.weekday()
     
@@ -200,6 +233,254 @@ def generate_realistic_energy_data(device_states_data=None):
         'device_change_count': device_change_count
     }
 
+def parse_timestamp(value):
+    timestamp = value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return timestamp
+
+def truncate_to_hour(timestamp):
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+def empty_hour_bucket():
+    return {'consumption_wh': 0.0, 'baseline_wh': 0.0, 'baselined_consumption_wh': 0.0, 'optimized_wh': 0.0, 'occupied_hours': 0.0}
+
+def get_window_hours():
+    window_end = truncate_to_hour(attribution_watermark or datetime.now())
+    return [window_end - timedelta(hours=offset) for offset in range(GEOFENCE_WINDOW_HOURS - 1, -1, -1)]
+
+def summarize_zone_aggregates(zone_id):
+    summary = empty_hour_bucket()
+    for bucket in zone_hourly_aggregates.get(zone_id, {}).values():
+        for key in summary:
+            summary[key] += bucket[key]
+    return summary
+
+def calculate_bucket_savings_wh(bucket):
+    if bucket['baseline_wh'] <= 0:
+        return None
+    return bucket['baseline_wh'] - bucket['baselined_consumption_wh']
+
+def calculate_zone_savings_percent(summary):
+    savings_wh = calculate_bucket_savings_wh(summary)
+    if savings_wh is None:
+        return None
+    return round(100.0 * savings_wh / summary['baseline_wh'], 1)
+
+def calculate_zone_efficiency(summary):
+    savings_percent = calculate_zone_savings_percent(summary)
+    if summary['occupied_hours'] <= 0 or savings_percent is None:
+        return None
+    return max(-100.0, min(100.0, savings_percent))
+
+def record_presence_event(zone_id, event_type, timestamp=None):
+    timestamp = parse_timestamp(timestamp) if timestamp else datetime.now()
+    
+    with attribution_lock:
+        if attribution_watermark and timestamp < attribution_watermark:
+            timestamp = attribution_watermark
+        
+        intervals = zone_presence_intervals.setdefault(zone_id, [])
+        is_present = bool(intervals) and intervals[-1][1] is None
+        
+        if event_type == 'enter' and not is_present:
+            if intervals and timestamp < intervals[-1][1]:
+                timestamp = intervals[-1][1]
+            intervals.append([timestamp, None])
+            is_present = True
+        elif event_type == 'exit' and is_present:
+            intervals[-1][1] = max(timestamp, intervals[-1][0])
+            is_present = False
+        
+        return is_present
+
+def split_interval_by_hour(start, end):
+    segments = []
+    cursor = start
+    while cursor < end:
+        segment_end = min(end, truncate_to_hour(cursor) + timedelta(hours=1))
+        segments.append((cursor, segment_end))
+        cursor = segment_end
+    return segments
+
+def get_occupancy_slices(start, end):
+    overlaps = []
+    for zone_id, intervals in zone_presence_intervals.items():
+        for entered_at, exited_at in intervals:
+            overlap_start = max(entered_at, start)
+            overlap_end = min(exited_at or end, end)
+            if overlap_start < overlap_end:
+                overlaps.append((zone_id, overlap_start, overlap_end))
+    
+    if not overlaps:
+        return []
+    
+    breakpoints = sorted({start, end} | {o[1] for o in overlaps} | {o[2] for o in overlaps})
+    slices = []
+    for slice_start, slice_end in zip(breakpoints, breakpoints[1:]):
+        occupants = [zone_id for zone_id, o_start, o_end in overlaps if o_start <= slice_start and o_end >= slice_end]
+        if occupants:
+            slices.append((slice_start, slice_end, occupants))
+    return slices
+
+def get_baseline_power(zone_id, hour_start):
+    zone_history = zone_hourly_power.get(zone_id, {})
+    energy_wh = 0.0
+    hours = 0.0
+    for days_back in range(1, BASELINE_DAYS + 1):
+        history = zone_history.get(hour_start - timedelta(days=days_back))
+        if history:
+            energy_wh += history[0]
+            hours += history[1]
+    return energy_wh / hours if hours > 0 else None
+
+def attribute_energy_segment(start, end, power):
+    hour_start = truncate_to_hour(start)
+    hourly_totals = geofence_hourly_totals.setdefault(hour_start, empty_hour_bucket())
+    touched_zones = set()
+    
+    for slice_start, slice_end, occupants in get_occupancy_slices(start, end):
+        slice_hours = (slice_end - slice_start).total_seconds() / 3600
+        consumption_wh = power * slice_hours
+        share = 1.0 / len(occupants)
+        
+        hourly_totals['consumption_wh'] += consumption_wh
+        hourly_totals['occupied_hours'] += slice_hours
+        
+        for zone_id in occupants:
+            baseline_power = get_baseline_power(zone_id, hour_start)
+            zone_consumption_wh = consumption_wh * share
+            if baseline_power is not None:
+                baseline_wh = baseline_power * slice_hours * share
+                baselined_consumption_wh = zone_consumption_wh
+                optimized_wh = min(zone_consumption_wh, baseline_wh)
+            else:
+                baseline_wh = 0.0
+                baselined_consumption_wh = 0.0
+                optimized_wh = zone_consumption_wh
+            
+            bucket = zone_hourly_aggregates.setdefault(zone_id, {}).setdefault(hour_start, empty_hour_bucket())
+            bucket['consumption_wh'] += zone_consumption_wh
+            bucket['baseline_wh'] += baseline_wh
+            bucket['baselined_consumption_wh'] += baselined_consumption_wh
+            bucket['optimized_wh'] += optimized_wh
+            bucket['occupied_hours'] += slice_hours
+            
+            hourly_totals['baseline_wh'] += baseline_wh
+            hourly_totals['baselined_consumption_wh'] += baselined_consumption_wh
+            hourly_totals['optimized_wh'] += optimized_wh
+            
+            history = zone_hourly_power.setdefault(zone_id, {}).setdefault(hour_start, [0.0, 0.0])
+            history[0] += consumption_wh
+            history[1] += slice_hours
+            touched_zones.add(zone_id)
+    
+    return touched_zones
+
+def prune_presence_intervals(watermark):
+    for zone_id, intervals in zone_presence_intervals.items():
+        zone_presence_intervals[zone_id] = [
+            interval for interval in intervals if interval[1] is None or interval[1] > watermark
+        ]
+
+def evict_expired_aggregates(watermark):
+    global last_eviction_hour
+    current_hour = truncate_to_hour(watermark)
+    if current_hour == last_eviction_hour:
+        return set()
+    last_eviction_hour = current_hour
+    
+    window_start = current_hour - timedelta(hours=GEOFENCE_WINDOW_HOURS - 1)
+    history_start = current_hour - timedelta(days=BASELINE_DAYS)
+    
+    for hour_start in [h for h in geofence_hourly_totals if h < window_start]:
+        del geofence_hourly_totals[hour_start]
+    for zone_history in zone_hourly_power.values():
+        for hour_start in [h for h in zone_history if h < history_start]:
+            del zone_history[hour_start]
+    
+    evicted_zones = set()
+    for zone_id, buckets in zone_hourly_aggregates.items():
+        for hour_start in [h for h in buckets if h < window_start]:
+            del buckets[hour_start]
+            evicted_zones.add(zone_id)
+    return evicted_zones
+
+def refresh_zone_energy_savings(zone_ids):
+    for geofence in geofence_data:
+        if geofence['id'] in zone_ids:
+            geofence['energy_savings'] = calculate_zone_savings_percent(summarize_zone_aggregates(geofence['id']))
+
+def ingest_energy_reading(reading):
+    global attribution_watermark, last_attributed_power, geofence_aggregates_version, cached_geofence_analytics
+    timestamp = parse_timestamp(reading['timestamp'])
+    power = float(reading['consumption'])
+    
+    with attribution_lock:
+        if attribution_watermark is not None and timestamp <= attribution_watermark:
+            return
+        
+        if attribution_watermark is not None:
+            start = max(attribution_watermark, timestamp - timedelta(hours=MAX_ATTRIBUTION_GAP_HOURS))
+            interval_power = (last_attributed_power + power) / 2
+            touched_zones = set()
+            for segment_start, segment_end in split_interval_by_hour(start, timestamp):
+                touched_zones |= attribute_energy_segment(segment_start, segment_end, interval_power)
+            
+            prune_presence_intervals(timestamp)
+            touched_zones |= evict_expired_aggregates(timestamp)
+            refresh_zone_energy_savings(touched_zones)
+            geofence_aggregates_version += 1
+            cached_geofence_analytics = None
+        
+        attribution_watermark = timestamp
+        last_attributed_power = power
+
+def seed_presence_schedule(home_id, work_id, start, end):
+    current_zone = None
+    cursor = truncate_to_hour(start)
+    while cursor <= end:
+        zone_id = work_id if cursor.weekday() < 5 and 9 <= cursor.hour < 17 else home_id
+        if zone_id != current_zone:
+            if current_zone is not None:
+                record_presence_event(current_zone, 'exit', cursor)
+            record_presence_event(zone_id, 'enter', cursor)
+            current_zone = zone_id
+        cursor += timedelta(hours=1)
+
+def build_geofence_analytics():
+    window_hours = get_window_hours()
+    energy_optimization = []
+    for index in range(0, GEOFENCE_WINDOW_HOURS, 3):
+        buckets = [geofence_hourly_totals.get(h, empty_hour_bucket()) for h in window_hours[index:index + 3]]
+        energy_optimization.append({
+            'hour': window_hours[index].strftime('%H:00'),
+            'consumption': round(sum(b['consumption_wh'] for b in buckets) / 1000, 3),
+            'optimized': round(sum(b['optimized_wh'] for b in buckets) / 1000, 3)
+        })
+    
+    zone_efficiency = []
+    for geofence in geofence_data:
+        summary = summarize_zone_aggregates(geofence['id'])
+        savings_wh = calculate_bucket_savings_wh(summary)
+        zone_efficiency.append({
+            'id': geofence['id'],
+            'name': geofence['name'],
+            'efficiency': calculate_zone_efficiency(summary),
+            'consumption_kwh': round(summary['consumption_wh'] / 1000, 2),
+            'savings_kwh': round(savings_wh / 1000, 2) if savings_wh is not None else None,
+            'occupied_hours': round(summary['occupied_hours'], 1)
+        })
+    
+    return {
+        'energy_optimization': energy_optimization,
+        'zone_efficiency': zone_efficiency,
+        'ml_metrics': {
+            'model_accuracy': 94.2,
+            'prediction_confidence': 92.8
+        }
+    }
+
 def initialize_minimal_data():
     global energy_data, geofence_data, ml_performance_history, initialized, stable_ml_accuracy
     if initialized:
@@ -210,28 +491,27 @@ def initialize_minimal_data():
     num_hours_initial_data = 48
     base_time = datetime.now() - timedelta(hours=num_hours_initial_data)
     
-    for i in range(0, num_hours_initial_data, 2):
-        timestamp = base_time + timedelta(hours=i)
-        temp_data = generate_realistic_energy_data()
-        temp_data['timestamp'] = timestamp.isoformat()
-        temp_data['hour'] = timestamp.hour
-        temp_data['day_of_week'] = timestamp.weekday()
-        energy_data.append(temp_data)
-    
     geofence_data.extend([
         {
             'id': 1, 'name': 'Home', 'address': 'A-101, Ashoka Apartments, New Delhi, IN',
             'lat': 37.7749, 'lng': -122.4194, 'radius': 200, 'isActive': True, 'automations': 8,
-            'energy_savings': 52.3,
+            'energy_savings': None,
             'created_at': (datetime.now() - timedelta(days=30)).isoformat()
         },
         {
             'id': 2, 'name': 'Work Office', 'address': 'K-15, The Sinclairs Bayview, Dubai, UAE',
             'lat': 37.7849, 'lng': -122.4094, 'radius': 150, 'isActive': True, 'automations': 5,
-            'energy_savings': 33.7,
+            'energy_savings': None,
             'created_at': (datetime.now() - timedelta(days=20)).isoformat()
         }
     ])
+    seed_presence_schedule(1, 2, base_time, datetime.now())
+    
+    for i in range(0, num_hours_initial_data, 2):
+        timestamp = base_time + timedelta(hours=i)
+        temp_data = generate_realistic_energy_data(build_seed_device_states(timestamp), timestamp)
+        energy_data.append(temp_data)
+        ingest_energy_reading(temp_data)
     
     for i in range(7):
         date = datetime.now() - timedelta(days=6 - i)
@@ -376,6 +656,7 @@ def update_device_states():
         
         new_energy_point = generate_realistic_energy_data(device_states)
         energy_data.append(new_energy_point)
+        ingest_energy_reading(new_energy_point)
         
         if len(energy_data) > 200:
             energy_data.pop(0)
@@ -581,6 +862,7 @@ def get_geofences():
 
 @app.route('/api/geofences', methods=['POST'])
 def create_geofence():
+    global cached_geofence_analytics
     try:
         data = request.json
         new_geofence = {
@@ -591,11 +873,13 @@ def create_geofence():
             'lng': data.get('lng', -122.4194 + random.uniform(-0.01, 0.01)),
             'radius': data.get('radius', 200),
             'isActive': True,
-            'automations': int(random.randint(1, 6)),
-            'energy_savings': random.uniform(5, 15),
+            'automations': 0,
+            'energy_savings': None,
             'created_at': datetime.now().isoformat()
         }
-        geofence_data.append(new_geofence)
+        with attribution_lock:
+            geofence_data.append(new_geofence)
+            cached_geofence_analytics = None
         return jsonify(new_geofence)
         
     except Exception as e:
@@ -612,39 +896,85 @@ def get_geofence_stats():
         print(f"Error getting geofence stats: {e}")
         return jsonify({'error': 'Stats unavailable'}), 500
 
+@app.route('/api/geofences/<int:zone_id>/presence', methods=['POST'])
+def update_geofence_presence(zone_id):
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        
+        event_type = data.get('event')
+        if event_type not in ('enter', 'exit'):
+            return jsonify({'error': "Event must be 'enter' or 'exit'"}), 400
+        
+        timestamp = data.get('timestamp')
+        if timestamp is not None:
+            if not isinstance(timestamp, str):
+                return jsonify({'error': 'Invalid timestamp'}), 400
+            timestamp = parse_timestamp(timestamp)
+            if timestamp > datetime.now():
+                return jsonify({'error': 'Timestamp cannot be in the future'}), 400
+        
+        if not any(g['id'] == zone_id for g in geofence_data):
+            return jsonify({'error': 'Geofence not found'}), 404
+        
+        is_present = record_presence_event(zone_id, event_type, timestamp)
+        return jsonify({'id': zone_id, 'is_present': is_present})
+        
+    except ValueError:
+        return jsonify({'error': 'Invalid timestamp'}), 400
+    except Exception as e:
+        print(f"Error updating geofence presence: {e}")
+        return jsonify({'error': 'Failed to update presence'}), 500
+
 @app.route('/api/geofences/analytics', methods=['GET'])
 def get_geofence_analytics():
+    global cached_geofence_analytics
     try:
-        energy_optimization = []
-        for hour in range(0, 24, 3):
-            consumption = 15 + 10 * np.sin(2 * np.pi * hour / 24) + random.uniform(-1, 1)
-            optimized = consumption * 0.94
-            energy_optimization.append({
-                'hour': f"{hour:02d}:00",
-                'consumption': round(float(max(0, consumption)), 1),
-                'optimized': round(float(max(0, optimized)), 1)
-            })
+        with attribution_lock:
+            if cached_geofence_analytics is None:
+                cached_geofence_analytics = build_geofence_analytics()
+            result = cached_geofence_analytics
+            etag = f"geofence-analytics-{geofence_aggregates_version}-{len(geofence_data)}"
         
-        zone_efficiency = []
-        for geofence in geofence_data:
-            zone_efficiency.append({
-                'name': geofence['name'],
-                'efficiency': round(float(random.uniform(82, 88)), 1)
-            })
+        response = jsonify(result)
+        response.set_etag(etag)
+        return response.make_conditional(request)
         
-        ml_metrics = {
-            'model_accuracy': 94.2,
-            'prediction_confidence': 92.8
-        }
+    except Exception as e:
+        print(f"Error getting geofence analytics: {e}")
+        return jsonify({'error': 'Analytics unavailable'}), 500
+
+@app.route('/api/geofences/<int:zone_id>/analytics', methods=['GET'])
+def get_zone_analytics(zone_id):
+    try:
+        if not any(g['id'] == zone_id for g in geofence_data):
+            return jsonify({'error': 'Geofence not found'}), 404
+        
+        with attribution_lock:
+            zone_buckets = zone_hourly_aggregates.get(zone_id, {})
+            hourly = []
+            for hour_start in get_window_hours():
+                bucket = zone_buckets.get(hour_start, empty_hour_bucket())
+                savings_wh = calculate_bucket_savings_wh(bucket)
+                hourly.append({
+                    'hour': hour_start.strftime('%H:00'),
+                    'timestamp': hour_start.isoformat(),
+                    'consumption_kwh': round(bucket['consumption_wh'] / 1000, 3),
+                    'savings_kwh': round(savings_wh / 1000, 3) if savings_wh is not None else None,
+                    'occupied_hours': round(bucket['occupied_hours'], 2)
+                })
+            summary = summarize_zone_aggregates(zone_id)
         
         return jsonify({
-            'energy_optimization': energy_optimization,
-            'zone_efficiency': zone_efficiency,
-            'ml_metrics': ml_metrics
+            'id': zone_id,
+            'hourly': hourly,
+            'efficiency': calculate_zone_efficiency(summary),
+            'energy_savings': calculate_zone_savings_percent(summary)
         })
         
     except Exception as e:
-        print(f"Error getting geofence analytics: {e}")
+        print(f"Error getting zone analytics: {e}")
         return jsonify({'error': 'Analytics unavailable'}), 500
 
 if __name__ == '__main__':
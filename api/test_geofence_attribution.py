@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as smart_home
+
+
+START = datetime(2026, 1, 5, 8, 0)
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setattr(smart_home, 'initialized', True)
+    monkeypatch.setattr(smart_home, 'models_trained', True)
+    monkeypatch.setattr(smart_home, 'geofence_data', [
+        {'id': 1, 'name': 'Home', 'isActive': True, 'automations': 0, 'energy_savings': None},
+        {'id': 2, 'name': 'Work Office', 'isActive': True, 'automations': 0, 'energy_savings': None}
+    ])
+    monkeypatch.setattr(smart_home, 'attribution_watermark', None)
+    monkeypatch.setattr(smart_home, 'last_attributed_power', None)
+    monkeypatch.setattr(smart_home, 'last_eviction_hour', None)
+    monkeypatch.setattr(smart_home, 'zone_presence_intervals', {})
+    monkeypatch.setattr(smart_home, 'zone_hourly_power', {})
+    monkeypatch.setattr(smart_home, 'zone_hourly_aggregates', {})
+    monkeypatch.setattr(smart_home, 'geofence_hourly_totals', {})
+    monkeypatch.setattr(smart_home, 'geofence_aggregates_version', 0)
+    monkeypatch.setattr(smart_home, 'cached_geofence_analytics', None)
+    return smart_home
+
+
+def ingest(engine, timestamp, consumption=100.0):
+    engine.ingest_energy_reading({'timestamp': timestamp.isoformat(), 'consumption': consumption})
+
+
+def test_split_interval_by_hour():
+    segments = smart_home.split_interval_by_hour(START + timedelta(minutes=30), START + timedelta(hours=2))
+    assert segments == [
+        (START + timedelta(minutes=30), START + timedelta(hours=1)),
+        (START + timedelta(hours=1), START + timedelta(hours=2))
+    ]
+
+
+def test_late_exit_is_clamped_to_last_reading(engine):
+    engine.record_presence_event(1, 'enter', START)
+    ingest(engine, START)
+    ingest(engine, START + timedelta(hours=1))
+
+    engine.record_presence_event(1, 'exit', START + timedelta(minutes=30))
+    assert engine.zone_presence_intervals[1][-1][1] == START + timedelta(hours=1)
+
+    ingest(engine, START + timedelta(hours=2))
+    summary = engine.summarize_zone_aggregates(1)
+    assert summary['occupied_hours'] == pytest.approx(1.0)
+    assert summary['consumption_wh'] == pytest.approx(100.0)
+
+
+def test_energy_is_split_between_overlapping_zones(engine):
+    engine.record_presence_event(1, 'enter', START)
+    engine.record_presence_event(2, 'enter', START + timedelta(minutes=30))
+    ingest(engine, START)
+    ingest(engine, START + timedelta(hours=1))
+
+    home = engine.zone_hourly_aggregates[1][START]
+    work = engine.zone_hourly_aggregates[2][START]
+    assert home['consumption_wh'] == pytest.approx(75.0)
+    assert work['consumption_wh'] == pytest.approx(25.0)
+    assert engine.geofence_hourly_totals[START]['consumption_wh'] == pytest.approx(100.0)
+
+
+def test_reading_gap_is_capped(engine):
+    engine.record_presence_event(1, 'enter', START)
+    ingest(engine, START)
+    ingest(engine, START + timedelta(hours=5))
+
+    summary = engine.summarize_zone_aggregates(1)
+    assert summary['occupied_hours'] == pytest.approx(engine.MAX_ATTRIBUTION_GAP_HOURS)
+
+
+def test_savings_use_the_zone_baseline_from_prior_days(engine):
+    engine.record_presence_event(1, 'enter', START)
+    ingest(engine, START, 100.0)
+    ingest(engine, START + timedelta(hours=1), 100.0)
+
+    engine.record_presence_event(1, 'exit', START + timedelta(hours=1))
+    ingest(engine, START + timedelta(days=1), 100.0)
+    engine.record_presence_event(1, 'enter', START + timedelta(days=1))
+    ingest(engine, START + timedelta(days=1, hours=1), 60.0)
+
+    bucket = engine.zone_hourly_aggregates[1][START + timedelta(days=1)]
+    assert bucket['baseline_wh'] == pytest.approx(100.0)
+    assert engine.calculate_bucket_savings_wh(bucket) == pytest.approx(20.0)
+    assert engine.geofence_data[0]['energy_savings'] == pytest.approx(20.0)
+
+
+def test_buckets_are_evicted_after_the_window(engine):
+    engine.record_presence_event(1, 'enter', START)
+    for hour in range(31):
+        ingest(engine, START + timedelta(hours=hour))
+    ingest(engine, START + timedelta(hours=30, minutes=30))
+
+    window_start = START + timedelta(hours=30 - engine.GEOFENCE_WINDOW_HOURS + 1)
+    assert len(engine.zone_hourly_aggregates[1]) == engine.GEOFENCE_WINDOW_HOURS
+    assert min(engine.zone_hourly_aggregates[1]) == window_start
+    assert min(engine.geofence_hourly_totals) == window_start
+
+
+def test_analytics_returns_304_for_matching_etag(engine):
+    engine.record_presence_event(1, 'enter', START)
+    ingest(engine, START)
+    ingest(engine, START + timedelta(hours=1))
+    client = engine.app.test_client()
+
+    response = client.get('/api/geofences/analytics')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert client.get('/api/geofences/analytics', headers={'If-None-Match': etag}).status_code == 304
+
+    ingest(engine, START + timedelta(hours=2))
+    assert client.get('/api/geofences/analytics', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_presence_rejects_invalid_requests(engine):
+    client = engine.app.test_client()
+    future = (datetime.now() + timedelta(days=1)).isoformat()
+
+    assert client.post('/api/geofences/1/presence', data='enter', content_type='text/plain').status_code == 400
+    assert client.post('/api/geofences/1/presence', json=['enter']).status_code == 400
+    assert client.post('/api/geofences/1/presence', json={'event': 'exit', 'timestamp': 123}).status_code == 400
+    assert client.post('/api/geofences/1/presence', json={'event': 'enter', 'timestamp': future}).status_code == 400
+    assert client.post('/api/geofences/9/presence', json={'event': 'enter'}).status_code == 404